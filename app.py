@@ -1,6 +1,13 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, stream_with_context
+from flask_caching import Cache
+from concurrent.futures import ThreadPoolExecutor
 import gitlab_util  # Import your GitLab API script
+import hashlib
+import itertools
 import logging
+import orjson
+import os
+import uuid
 
 # Configure logging
 logging.basicConfig(
@@ -11,22 +18,61 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Cache for /items responses, in-process by default or shared via e.g. CACHE_TYPE=RedisCache
+app.config.from_mapping(
+    CACHE_TYPE=os.environ.get("CACHE_TYPE", "SimpleCache"),
+    CACHE_REDIS_URL=os.environ.get("CACHE_REDIS_URL")
+)
+cache = Cache(app)
+# In-process backends can't be seen by the other gunicorn workers
+CACHE_IS_SHARED = app.config["CACHE_TYPE"] not in ("SimpleCache", "NullCache")
+# Token in the cache backend that changes on every invalidation, so each worker knows
+# when to drop its own in-process GitLab lookups
+CACHE_GENERATION_KEY = "cache_generation"
+_local_cache_generation = None
+# Past years only change when existing items are updated, the current year changes constantly
+ITEMS_CACHE_TTL_PAST = int(os.environ.get("ITEMS_CACHE_TTL_PAST", "86400"))
+ITEMS_CACHE_TTL_CURRENT = int(os.environ.get("ITEMS_CACHE_TTL_CURRENT", "300"))
+
+REQUIRED_PERMISSION_PARAMS = ['username', 'target', 'role']
+# Number of permission changes applied at once by /permissions
+BULK_PERMISSION_WORKERS = int(os.environ.get("BULK_PERMISSION_WORKERS", "16"))
+
+def json_response(payload, status=200):
+    """Serialize a payload with orjson, which is much faster than jsonify and needs no app context"""
+    return app.response_class(orjson.dumps(payload), status=status, mimetype='application/json')
+
+def ndjson_stream(items):
+    """Encode items as newline-delimited JSON, ending with an error line if GitLab fails mid-stream"""
+    try:
+        for item in items:
+            yield orjson.dumps(item) + b"\n"
+    except gitlab_util.GitLabError as e:
+        logger.error("Streaming items failed: %s", e)
+        yield orjson.dumps({"status": "error", "message": str(e)}) + b"\n"
+
+# Bodies of the constant responses, serialized once at startup
+INDEX_BODY = orjson.dumps({
+    "service": "GitLab API Service",
+    "endpoints": {
+        "/health": "Health check endpoint",
+        "/permission": "POST endpoint to modify user permissions",
+        "/permissions": "POST endpoint to modify permissions for many users at once",
+        "/items": "GET endpoint to retrieve issues or merge requests by year",
+        "/cache/invalidate": "POST endpoint to clear cached GitLab lookups and responses"
+    }
+})
+HEALTH_OK_BODY = b'{"status":"ok"}'
+
 @app.route('/', methods=['GET'])
 def index():
     """Root endpoint with usage instructions"""
-    return jsonify({
-        "service": "GitLab API Service",
-        "endpoints": {
-            "/health": "Health check endpoint",
-            "/permission": "POST endpoint to modify user permissions",
-            "/items": "GET endpoint to retrieve issues or merge requests by year"
-        }
-    })
+    return app.response_class(INDEX_BODY, mimetype='application/json')
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint"""
-    return jsonify({"status": "ok"})
+    return app.response_class(HEALTH_OK_BODY, mimetype='application/json')
 
 @app.route('/permission', methods=['POST'])
 def permission():
@@ -35,18 +81,17 @@ def permission():
     data = request.json
     if not data:
         logger.error("No JSON data provided in the request")
-        return jsonify({"status": "error", "message": "No JSON data provided"}), 400
+        return json_response({"status": "error", "message": "No JSON data provided"}, 400)
 
     # Validate required parameters
-    required_params = ['username', 'target', 'role']
-    missing_params = [param for param in required_params if param not in data]
+    missing_params = [param for param in REQUIRED_PERMISSION_PARAMS if param not in data]
     if missing_params:
         error_msg = f"Missing required parameters: {', '.join(missing_params)}"
         logger.error(error_msg)
-        return jsonify({"status": "error", "message": error_msg}), 400
+        return json_response({"status": "error", "message": error_msg}, 400)
 
     # Call the function
-    logger.info(f"Modifying permission for user {data['username']} on {data['target']} to {data['role']}")
+    logger.info("Modifying permission for user %s on %s to %s", data['username'], data['target'], data['role'])
     result = gitlab_util.modify_permission(
         data['username'],
         data['target'],
@@ -55,10 +100,53 @@ def permission():
 
     # Return the result
     if result and result.get("status") == "success":
-        return jsonify(result)
+        return json_response(result)
     else:
         # Return the error with status code 400
-        return jsonify(result), 400
+        return json_response(result, 400)
+
+def apply_permission_change(change):
+    """Apply a single change from a /permissions request"""
+    if not isinstance(change, dict):
+        return {"status": "error", "message": "Each change must be an object"}
+
+    missing_params = [param for param in REQUIRED_PERMISSION_PARAMS if param not in change]
+    if missing_params:
+        return {"status": "error", "message": f"Missing required parameters: {', '.join(missing_params)}"}
+
+    return gitlab_util.modify_permission(change['username'], change['target'], change['role'])
+
+@app.route('/permissions', methods=['POST'])
+def permissions():
+    """Endpoint to modify permissions for many users at once"""
+    # Get parameters from the request
+    data = request.json
+    if not isinstance(data, dict) or not isinstance(data.get('changes'), list) or not data['changes']:
+        error_msg = "A non-empty 'changes' list is required"
+        logger.error(error_msg)
+        return json_response({"status": "error", "message": error_msg}, 400)
+
+    # Apply the changes concurrently, results keep the order of the request
+    changes = data['changes']
+    logger.info("Applying %d permission changes", len(changes))
+    with ThreadPoolExecutor(max_workers=min(BULK_PERMISSION_WORKERS, len(changes))) as executor:
+        results = list(executor.map(apply_permission_change, changes))
+
+    succeeded = sum(1 for result in results if result and result.get("status") == "success")
+    if succeeded == len(results):
+        status = "success"
+    elif succeeded:
+        status = "partial"
+    else:
+        status = "error"
+
+    response = {
+        "status": status,
+        "message": f"Applied {succeeded} of {len(results)} permission changes",
+        "results": results
+    }
+    # Return status code 400 unless every change succeeded
+    return json_response(response, 200 if status == "success" else 400)
 
 @app.route('/items', methods=['GET'])
 def items():
@@ -71,25 +159,103 @@ def items():
     if not item_type:
         error_msg = "Missing required parameter: type"
         logger.error(error_msg)
-        return jsonify({"status": "error", "message": error_msg}), 400
+        return json_response({"status": "error", "message": error_msg}, 400)
     if not year:
         error_msg = "Missing required parameter: year"
         logger.error(error_msg)
-        return jsonify({"status": "error", "message": error_msg}), 400
+        return json_response({"status": "error", "message": error_msg}, 400)
 
-    # Call the function
-    logger.info(f"Retrieving {item_type} for year {year}")
-    result = gitlab_util.get_items_by_year(item_type, year)
+    errors, year = gitlab_util.validate_items(item_type, year)
+    if errors:
+        logger.error("Validation errors: %s", errors)
+        return json_response({"status": "error", "errors": errors}, 400)
 
-    # Return the result
-    if result and result.get("status") == "success":
-        return jsonify(result)
+    # Stream items as newline-delimited JSON when asked to
+    if request.args.get('stream') == '1':
+        if item_type == gitlab_util.ALL_ITEMS:
+            error_msg = "Streaming requires type 'mr' or 'issues'"
+            logger.error(error_msg)
+            return json_response({"status": "error", "message": error_msg}, 400)
+        logger.info("Streaming %s for year %s", item_type, year)
+        items_iter = gitlab_util.iter_items_by_year(item_type, year)
+
+        # Fetch the first page before sending headers, so failing requests still get a 400
+        try:
+            first_item = next(items_iter, None)
+        except gitlab_util.GitLabError as e:
+            error_msg = str(e)
+            logger.error(error_msg)
+            return json_response({"status": "error", "message": error_msg}, 400)
+        if first_item is not None:
+            items_iter = itertools.chain([first_item], items_iter)
+
+        return Response(stream_with_context(ndjson_stream(items_iter)), mimetype='application/x-ndjson')
+
+    # Serve from the cache when possible, only successful results are cached.
+    # The key uses the validated year so e.g. '2023' and '02023' share an entry
+    cache_key = f"items:{item_type}:{year}"
+    cached = cache.get(cache_key)
+    if cached is None:
+        # Call the function
+        logger.info("Retrieving %s for year %s", item_type, year)
+        result = gitlab_util.collect_items_by_year(item_type, year)
+        if not result or result.get("status") != "success":
+            # Return the error with status code 400
+            return json_response(result, 400)
+
+        body = orjson.dumps(result)
+        # The digest is only a cache validator, so FIPS-enabled builds allow md5 here
+        cached = (body, hashlib.md5(body, usedforsecurity=False).hexdigest())
+        is_current_year = year == gitlab_util.CURRENT_YEAR
+        cache.set(cache_key, cached, timeout=ITEMS_CACHE_TTL_CURRENT if is_current_year else ITEMS_CACHE_TTL_PAST)
     else:
-        # Return the error with status code 400
-        return jsonify(result), 400
+        logger.info("Serving cached %s for year %s", item_type, year)
+
+    # Return the result, or 304 if the client already has it
+    body, etag = cached
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+def current_cache_generation():
+    """Return the cache generation token, creating one if the backend has none yet"""
+    generation = cache.get(CACHE_GENERATION_KEY)
+    if generation is None:
+        cache.add(CACHE_GENERATION_KEY, uuid.uuid4().hex, timeout=0)
+        generation = cache.get(CACHE_GENERATION_KEY)
+    return generation
+
+@app.before_request
+def sync_cache_generation():
+    """Drop this worker's GitLab lookups if another worker invalidated the caches"""
+    global _local_cache_generation
+    if request.endpoint == 'health_check':
+        return
+    generation = current_cache_generation()
+    if generation != _local_cache_generation:
+        if _local_cache_generation is not None:
+            gitlab_util.clear_caches()
+        _local_cache_generation = generation
+
+@app.route('/cache/invalidate', methods=['POST'])
+def invalidate_cache():
+    """Endpoint to clear cached GitLab lookups and /items responses"""
+    global _local_cache_generation
+    gitlab_util.clear_caches()
+    cache.clear()
+    # A new generation makes the other workers clear their lookups on their next request
+    _local_cache_generation = uuid.uuid4().hex
+    cache.set(CACHE_GENERATION_KEY, _local_cache_generation, timeout=0)
+
+    if CACHE_IS_SHARED:
+        return json_response({"status": "success", "message": "Cache cleared on all workers"})
+    return json_response({
+        "status": "success",
+        "message": "Cache cleared on this worker only, set CACHE_TYPE to a shared backend such as RedisCache to clear all workers"
+    })
 
 if __name__ == '__main__':
     # Log when the app starts
     logger.info("Starting GitLab API Service")
-    # Run the Flask app
+    # Run the Flask development server (production runs under gunicorn, see gunicorn_conf.py)
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -1,49 +1,72 @@
-from requests.utils import quote
+from urllib.parse import quote
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from datetime import datetime
+from cachetools import TTLCache
+import collections
+import contextlib
+import functools
+import itertools
 import json
+import orjson
 import requests
-import re
 import os
+import threading
 import argparse
 import logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-def validate_inputs(username=None, target=None, role=None, item_type=None, year=None):
-    """Validate input parameters for both functions"""
+def validate_permission(username, target, role):
+    """Validate input parameters for modify_permission"""
     errors = []
 
-    if username is not None and not username.strip():
+    if not isinstance(username, str):
+        errors.append("Username must be a string")
+    elif not username.strip():
         errors.append("Username cannot be empty")
 
-    if target is not None and not target.strip():
+    if not isinstance(target, str):
+        errors.append("Target (group/project) must be a string")
+    elif not target.strip():
         errors.append("Target (group/project) cannot be empty")
 
-    if role is not None and role.lower() not in ROLE_MAPPING:
-        errors.append(f"Invalid role: {role}. Valid roles are: {', '.join(ROLE_MAPPING.keys())}")
+    if not isinstance(role, str) or role.lower() not in ROLE_MAPPING:
+        errors.append(f"Invalid role: {role}. Valid roles are: {_ROLE_NAMES}")
 
-    if item_type is not None and item_type not in ["mr", "issues"]:
-        errors.append(f"Invalid item type: {item_type}. Must be 'mr' or 'issues'")
+    # Check if token is set
+    if not TOKEN:
+        errors.append("GITLAB_TOKEN environment variable is not set")
+
+    return errors
+
+def validate_items(item_type, year):
+    """
+    Validate input parameters for get_items_by_year
+
+    Returns:
+        tuple: (errors, year) - year converted to int, or None if it is invalid
+    """
+    errors = []
+
+    if item_type != ALL_ITEMS and item_type not in ITEMS:
+        errors.append(f"Invalid item type: {item_type}. Must be 'mr', 'issues' or 'all'")
 
-    if year is not None:
-        try:
-            year = int(year)
-            current_year = datetime.now().year
-            if year < 2010 or year > current_year:
-                errors.append(f"Invalid year: {year}. Must be between 2010 and {current_year}")
-        except ValueError:
-            errors.append(f"Year must be a valid integer, got '{year}'")
+    try:
+        year = int(year)
+        if year not in VALID_YEARS:
+            errors.append(f"Invalid year: {year}. Must be between 2010 and {CURRENT_YEAR}")
+            year = None
+    except (TypeError, ValueError):
+        errors.append(f"Year must be a valid integer, got '{year}'")
+        year = None
 
     # Check if token is set
     if not TOKEN:
         errors.append("GITLAB_TOKEN environment variable is not set")
 
-    return errors
+    return errors, year
 
 # Get configuration from environment variables
 GITLAB_URL = os.environ.get("GITLAB_URL", "https://gitlab.com/")
@@ -51,6 +74,24 @@ GITLAB_URL = os.environ.get("GITLAB_URL", "https://gitlab.com/")
 GITLAB_URL = GITLAB_URL.rstrip('/') + '/'
 TOKEN = os.environ.get("GITLAB_TOKEN")
 HEADERS = {"PRIVATE-TOKEN": TOKEN}
+if not TOKEN:
+    logger.warning("GITLAB_TOKEN environment variable is not set, GitLab requests will be rejected")
+
+# Threads shared by all requests for fetching item pages concurrently
+PAGE_FETCH_THREADS = int(os.environ.get("GITLAB_PAGE_THREADS", "32"))
+# Enough keep-alive connections for every page fetch thread plus every request-handling
+# thread (see gunicorn_conf.py), so connections are reused instead of discarded
+SESSION_POOL_SIZE = PAGE_FETCH_THREADS + int(os.environ.get("GUNICORN_THREADS", "32"))
+
+# Shared session so keep-alive connections to GitLab are reused across calls
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=SESSION_POOL_SIZE,
+    # Hand the last 5xx response back instead of raising, so callers report it like any other error
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504], raise_on_status=False)
+))
 
 ROLE_MAPPING = {
     "guest": 10,
@@ -59,6 +100,65 @@ ROLE_MAPPING = {
     "maintainer": 40,
     "owner": 50  # Only for groups, not for projects
 }
+ROLE_CHOICES = list(ROLE_MAPPING)
+_ROLE_NAMES = ", ".join(ROLE_CHOICES)
+
+# Username -> user ID lookups rarely change, so keep them around for a while
+_USER_ID_CACHE = TTLCache(maxsize=1024, ttl=int(os.environ.get("GITLAB_CACHE_TTL", "10800")))
+_USER_ID_CACHE_LOCK = threading.Lock()
+
+# (target, user_id) pairs known to be members, so role changes can go straight to PUT.
+# Only used to pick the first request, never to skip one: other workers and people
+# change roles too, so GitLab stays the source of truth for the current level.
+_MEMBER_CACHE = TTLCache(maxsize=4096, ttl=600)
+_MEMBER_CACHE_LOCK = threading.Lock()
+
+def _lookup_user_id(username):
+    """
+    Resolve a GitLab username to its user ID, using the in-process cache when possible
+
+    Args:
+        username (str): The GitLab username
+
+    Returns:
+        tuple: (user_id, error_msg) - error_msg is None on success
+    """
+    with _USER_ID_CACHE_LOCK:
+        user_id = _USER_ID_CACHE.get(username)
+    if user_id is not None:
+        logger.info("Using cached user ID %s for username %s", user_id, username)
+        return user_id, None
+
+    logger.info("Looking up user ID for username: %s", username)
+    user_res = SESSION.get(
+        f"{GITLAB_URL}api/v4/users?username={username}",
+        timeout=10
+    )
+
+    # Check response status
+    if user_res.status_code != 200:
+        return None, f"API request failed with status {user_res.status_code}: {user_res.text}"
+
+    users = user_res.json()
+
+    # Determine if user exists
+    if not users:
+        return None, f"User '{username}' not found"
+
+    # Extract user ID
+    user_id = users[0]["id"]
+    logger.info("Found user ID %d for username %s", user_id, username)
+    with _USER_ID_CACHE_LOCK:
+        _USER_ID_CACHE[username] = user_id
+    return user_id, None
+
+def clear_caches():
+    """Drop all cached GitLab lookups"""
+    with _USER_ID_CACHE_LOCK:
+        _USER_ID_CACHE.clear()
+    with _MEMBER_CACHE_LOCK:
+        _MEMBER_CACHE.clear()
+    logger.info("Cleared GitLab lookup caches")
 
 def modify_permission(username, target, role):
     """
@@ -70,76 +170,74 @@ def modify_permission(username, target, role):
         role (str): The role to assign
 
     Returns:
-        dict: JSON response on success, or error information on failure
+        dict: The applied user_id and access_level on success, or error information on failure
     """
     # Validate inputs and return errors if any
-    errors = validate_inputs(username=username, target=target, role=role)
+    errors = validate_permission(username, target, role)
     if errors:
-        logger.error(f"Validation errors: {errors}")
+        logger.error("Validation errors: %s", errors)
         return {"status": "error", "errors": errors}
 
+    role_lower = role.lower()
+    access_level = ROLE_MAPPING[role_lower]
+    is_project = "/" in target
+
     # Check if role is 'owner' for a project (not supported)
-    if "/" in target and role.lower() == "owner":
+    if is_project and role_lower == "owner":
         logger.error("Owner role is not supported for projects")
         return {"status": "error", "message": "Owner role is not supported for projects"}
 
     try:
         # Get user ID
-        logger.info(f"Looking up user ID for username: {username}")
-        user_res = requests.get(
-            f"{GITLAB_URL}api/v4/users?username={username}",
-            headers=HEADERS,
-            timeout=10
-        )
-
-        # Check response status
-        if user_res.status_code != 200:
-            error_msg = f"API request failed with status {user_res.status_code}: {user_res.text}"
-            logger.error(error_msg)
-            return {"status": "error", "message": error_msg}
-
-        users = user_res.json()
-
-        # Determine if user exists
-        if not users:
-            error_msg = f"User '{username}' not found"
+        user_id, error_msg = _lookup_user_id(username)
+        if error_msg:
             logger.error(error_msg)
             return {"status": "error", "message": error_msg}
 
-        # Extract user ID
-        user_id = users[0]["id"]
-        logger.info(f"Found user ID {user_id} for username {username}")
-
         # Determine if target is a group or project
-        if "/" in target:
+        if is_project:
             # It's a project
-            endpoint = f"{GITLAB_URL}api/v4/projects/{requests.utils.quote(target, safe='')}/members"
-            logger.info(f"Target '{target}' identified as a project")
+            endpoint = f"{GITLAB_URL}api/v4/projects/{quote(target, safe='')}/members"
+            logger.info("Target '%s' identified as a project", target)
         else:
             # It's a group
             endpoint = f'{GITLAB_URL}api/v4/groups/{target}/members'
-            logger.info(f"Target '{target}' identified as a group")
+            logger.info("Target '%s' identified as a group", target)
 
         # Set up data for the API call
         data = {
             "user_id": user_id,
-            "access_level": ROLE_MAPPING[role.lower()]
+            "access_level": access_level
         }
 
-        # Add or update the member
-        logger.info(f"Attempting to add {username} to {target} with role {role}")
-        response = requests.post(endpoint, json=data, headers=HEADERS)
-
-        # Check if the target exists
-        if response.status_code == 404:
-            error_msg = f"Target '{target}' not found"
-            logger.error(error_msg)
-            return {"status": "error", "message": error_msg}
-
-        # If the user is already a member, update their access level
-        if response.status_code == 409:  # 409 means conflict - user already exists
-            logger.info(f"User {username} already exists in {target}, updating role")
-            response = requests.put(f"{endpoint}/{user_id}", json=data, headers=HEADERS)
+        member_key = (target, user_id)
+        with _MEMBER_CACHE_LOCK:
+            known_member = member_key in _MEMBER_CACHE
+
+        response = None
+        if known_member:
+            # Known member, so update their access level directly
+            logger.info("User %s is a known member of %s, updating role", username, target)
+            response = SESSION.put(f"{endpoint}/{user_id}", json=data, timeout=30)
+            if response.status_code == 404:
+                # The membership is gone since we cached it, add the user again
+                response = None
+
+        if response is None:
+            # Add or update the member
+            logger.info("Attempting to add %s to %s with role %s", username, target, role)
+            response = SESSION.post(endpoint, json=data, timeout=30)
+
+            # Check if the target exists
+            if response.status_code == 404:
+                error_msg = f"Target '{target}' not found"
+                logger.error(error_msg)
+                return {"status": "error", "message": error_msg}
+
+            # If the user is already a member, update their access level
+            if response.status_code == 409:  # 409 means conflict - user already exists
+                logger.info("User %s already exists in %s, updating role", username, target)
+                response = SESSION.put(f"{endpoint}/{user_id}", json=data, timeout=30)
 
         # Check if the request was successful
         if response.status_code < 200 or response.status_code >= 300:
@@ -147,11 +245,14 @@ def modify_permission(username, target, role):
             logger.error(error_msg)
             return {"status": "error", "message": error_msg}
 
-        logger.info(f"Successfully set {username}'s role to {role} on {target}")
+        with _MEMBER_CACHE_LOCK:
+            _MEMBER_CACHE[member_key] = True
+
+        logger.info("Successfully set %s's role to %s on %s", username, role, target)
         return {
             "status": "success",
             "message": f"Successfully set {username}'s role to {role} on {target}",
-            "data": response.json()
+            "data": data
         }
 
     except requests.exceptions.RequestException as e:
@@ -166,109 +267,233 @@ def modify_permission(username, target, role):
         return {"status": "error", "message": error_msg}
 
 ITEMS = ["mr", "issues"]
-VALID_YEARS = list(range(2010, datetime.now().year + 1))
+# Item type that retrieves every type in ITEMS at once
+ALL_ITEMS = "all"
+# Fixed at startup, like the rest of the configuration
+CURRENT_YEAR = datetime.now().year
+VALID_YEARS = frozenset(range(2010, CURRENT_YEAR + 1))
+PER_PAGE = 100
+# The only fields we return for each item
+ITEM_FIELDS = ("id", "title", "created_at", "state", "web_url")
+# Pages a single paginator requests ahead of its consumer
+PAGE_FETCH_WORKERS = int(os.environ.get("GITLAB_PAGE_WORKERS", "8"))
+_PAGE_EXECUTOR = ThreadPoolExecutor(max_workers=PAGE_FETCH_THREADS, thread_name_prefix="gitlab-page")
+
+def _fetch_page(url, params=None):
+    """
+    Fetch a single page of items from a paginated GitLab endpoint
+
+    Args:
+        url (str): The API endpoint or a 'next' link returned by GitLab
+        params (dict, optional): Query parameters for the request
+
+    Returns:
+        tuple: (page_data, total_pages, next_url, error_msg) - total_pages and
+               next_url are None when GitLab doesn't report them, error_msg is
+               None on success
+    """
+    logger.info("Requesting %s with %s", url, params)
+    try:
+        response = SESSION.get(url, params=params, timeout=30)
+    except requests.exceptions.RequestException as e:
+        # Handle network-related errors
+        return [], None, None, f"Network error: {str(e)}"
+
+    # Check if the request was successful
+    if response.status_code != 200:
+        return [], None, None, f"Error: {response.status_code} - {response.text}"
+
+    try:
+        # Keep only the fields we return so full items don't pile up in memory
+        page_data = [{field: item[field] for field in ITEM_FIELDS} for item in orjson.loads(response.content)]
+    except orjson.JSONDecodeError:
+        return [], None, None, "Error: Invalid JSON response"
+
+    total_pages = response.headers.get("X-Total-Pages")
+    next_url = response.links.get("next", {}).get("url")
+    return page_data, int(total_pages) if total_pages else None, next_url, None
+
+def _fetch_pages_concurrently(endpoint, params, pages):
+    """
+    Fetch pages concurrently, yielding each _fetch_page result in page order
+
+    At most PAGE_FETCH_WORKERS pages are requested ahead of the consumer, on the
+    executor shared by all requests. When the consumer stops early (error or
+    closed generator) pages not started yet are cancelled instead of being waited for.
+
+    Args:
+        endpoint (str): The API endpoint to query
+        params (dict): Query parameters shared by all pages
+        pages (iterable): Page numbers to fetch
+    """
+    pages = iter(pages)
+    pending = collections.deque()
+    try:
+        for page in itertools.islice(pages, PAGE_FETCH_WORKERS):
+            pending.append(_PAGE_EXECUTOR.submit(_fetch_page, endpoint, {**params, "page": page}))
+        while pending:
+            result = pending.popleft().result()
+            # Keep the window full
+            for page in itertools.islice(pages, 1):
+                pending.append(_PAGE_EXECUTOR.submit(_fetch_page, endpoint, {**params, "page": page}))
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+@functools.lru_cache(maxsize=128)
+def _date_bounds(year):
+    """Return the (created_after, created_before) date range parameters for a year"""
+    return f"{year}-01-01T00:00:00Z", f"{year}-12-31T23:59:59Z"
+
+@functools.lru_cache(maxsize=4)
+def _items_endpoint(item_type):
+    """Return the API endpoint listing merge requests ('mr') or issues"""
+    if item_type == "mr":
+        # For merge requests
+        return f"{GITLAB_URL}api/v4/merge_requests"
+    # For issues
+    return f"{GITLAB_URL}api/v4/issues"
+
+class GitLabError(Exception):
+    """Raised when GitLab returns an error while paginating items"""
+
+def iter_items_by_year(item_type, year):
+    """
+    Yield items (merge requests or issues) created in a specific year, page by page
+
+    Inputs are not validated here, callers should validate them first.
+
+    Args:
+        item_type (str): Type of items to retrieve ('mr' or 'issues')
+        year (int): Year to filter by
+
+    Yields:
+        dict: Item with id, title, created_at, state, web_url
+
+    Raises:
+        GitLabError: If GitLab returns an error or an invalid response
+    """
+    created_after, created_before = _date_bounds(year)
+    logger.info("Retrieving %s created between %s and %s", item_type, created_after, created_before)
+    endpoint = _items_endpoint(item_type)
+
+    params = {
+        "created_after": created_after,
+        "created_before": created_before,
+        "per_page": PER_PAGE
+    }
+
+    # Fetch the first page, which also tells us how many pages there are
+    page_data, total_pages, next_url, error_msg = _fetch_page(endpoint, {**params, "page": 1})
+    if error_msg:
+        raise GitLabError(error_msg)
+    yield from page_data
+
+    if total_pages:
+        # GitLab reported the page count, so fetch the remaining pages concurrently
+        logger.info("Fetching %d more pages of %s concurrently", total_pages - 1, item_type)
+        with contextlib.closing(_fetch_pages_concurrently(endpoint, params, range(2, total_pages + 1))) as pages:
+            for page_data, _, _, error_msg in pages:
+                if error_msg:
+                    raise GitLabError(error_msg)
+                yield from page_data
+    else:
+        # No page count (GitLab omits it for very large result sets), so follow
+        # the 'next' links GitLab returns until there are none left
+        while next_url:
+            page_data, _, next_url, error_msg = _fetch_page(next_url)
+            if error_msg:
+                raise GitLabError(error_msg)
+            logger.info("Got %d more %s", len(page_data), item_type)
+            yield from page_data
 
 def get_items_by_year(item_type, year):
     """
     Get items (merge requests or issues) created in a specific year
 
     Args:
-        item_type (str): Type of items to retrieve ('mr' or 'issues')
+        item_type (str): Type of items to retrieve ('mr', 'issues' or 'all')
         year (int or str): Year to filter by
 
     Returns:
-        dict: Filtered list of items with id, title, created_at, state, web_url, or error information
+        dict: Filtered list of items with id, title, created_at, state, web_url, or error information.
+              For 'all', data maps each item type to its list of items.
     """
     # Validate inputs and return errors if any
-    errors = validate_inputs(item_type=item_type, year=year)
+    errors, year = validate_items(item_type, year)
     if errors:
-        logger.error(f"Validation errors: {errors}")
+        logger.error("Validation errors: %s", errors)
         return {"status": "error", "errors": errors}
 
-    # Convert year to integer if it's a string
-    try:
-        year = int(year)
-    except ValueError:
-        error_msg = f"Error: year must be a 4-digit number, got '{year}'"
-        logger.error(error_msg)
-        return {"status": "error", "message": error_msg}
-
-    # Format check & Check if year exists
-    if not re.fullmatch(r"\d{4}", str(year)) or year not in VALID_YEARS:
-        error_msg = f"Invalid year: {year}. Must be 4 digits and between 2010 and {datetime.now().year}"
-        logger.error(error_msg)
-        return {"status": "error", "message": error_msg}
-
-    # Create date range parameters
-    created_after = f"{year}-01-01T00:00:00Z"
-    created_before = f"{year}-12-31T23:59:59Z"
-    logger.info(f"Retrieving {item_type} created between {created_after} and {created_before}")
+    return collect_items_by_year(item_type, year)
 
-    if item_type == "mr":
-        # For merge requests
-        endpoint = f"{GITLAB_URL}api/v4/merge_requests"
-    else:
-        # For issues
-        endpoint = f"{GITLAB_URL}api/v4/issues"
-
-    current_page = 1
-    all_results = []
-
-    while True:
-        # Parameters for the API request
-        params = {
-            "created_after": created_after,
-            "created_before": created_before,
-            "per_page": 100,
-            "page": current_page
-        }
+def collect_items_by_year(item_type, year):
+    """
+    Collect items (merge requests or issues) created in a specific year
 
-        logger.info(f"Requesting page {current_page} of {item_type}")
-        response = requests.get(endpoint, params=params, headers=HEADERS)
+    Like get_items_by_year, but inputs are not validated here, callers should
+    validate them first (see validate_items).
 
-        # Check if the request was successful
-        if response.status_code != 200:
-            error_msg = f"Error: {response.status_code} - {response.text}"
-            logger.error(error_msg)
-            return {"status": "error", "message": error_msg}
+    Args:
+        item_type (str): Type of items to retrieve ('mr', 'issues' or 'all')
+        year (int): Year to filter by
 
-        try:
-            # Get data from current page
-            page_data = response.json()
-        except json.JSONDecodeError:
-            error_msg = "Error: Invalid JSON response"
-            logger.error(error_msg)
-            return {"status": "error", "message": error_msg}
+    Returns:
+        dict: Same result as get_items_by_year
+    """
+    try:
+        if item_type == ALL_ITEMS:
+            # Paginate every item type at the same time, stopping all of them if one fails
+            stop = threading.Event()
+
+            def collect(t):
+                items = []
+                with contextlib.closing(iter_items_by_year(t, year)) as items_iter:
+                    for item in items_iter:
+                        if stop.is_set():
+                            break
+                        items.append(item)
+                return items
+
+            executor = ThreadPoolExecutor(max_workers=len(ITEMS))
+            try:
+                futures = [executor.submit(collect, t) for t in ITEMS]
+                done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+                # Stop the other paginators before reporting whichever one failed first
+                for future in done:
+                    if future.exception() is not None:
+                        stop.set()
+                        raise future.exception()
+                all_results = dict(zip(ITEMS, (future.result() for future in futures)))
+            finally:
+                stop.set()
+                executor.shutdown(wait=False, cancel_futures=True)
+            count = sum(len(items) for items in all_results.values())
+            item_type = " and ".join(ITEMS)
+        else:
+            all_results = list(iter_items_by_year(item_type, year))
+            count = len(all_results)
+    except GitLabError as e:
+        error_msg = str(e)
+        logger.error(error_msg)
+        return {"status": "error", "message": error_msg}
 
-        # If no more data, break the loop
-        if not page_data:
-            logger.info(f"Found {len(all_results)} {item_type} from {year}")
-            # Filter results to include only essential fields
-            filtered_results = [
-                {
-                    "id": item["id"],
-                    "title": item["title"],
-                    "created_at": item["created_at"],
-                    "state": item["state"],
-                    "web_url": item["web_url"]
-                }
-                for item in all_results
-            ]
-            return {
-                "status": "success",
-                "message": f"Retrieved {len(filtered_results)} {item_type} from {year}",
-                "data": filtered_results
-            }
-
-        # Add data to the result list
-        all_results.extend(page_data)
-        logger.info(f"Added {len(page_data)} items from page {current_page}, total: {len(all_results)}")
-
-        # Go to the next page
-        current_page += 1
+    logger.info("Found %d %s from %d", count, item_type, year)
+    return {
+        "status": "success",
+        "message": f"Retrieved {count} {item_type} from {year}",
+        "data": all_results
+    }
 
 def main():
     """Command line interface for GitLab API functions"""
+    # Configure logging (the Flask app configures its own when imported from app.py)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
     parser = argparse.ArgumentParser(description='GitLab API Functions')
     subparsers = parser.add_subparsers(dest='command', help='Command to execute')
 
@@ -276,12 +501,12 @@ def main():
     permission_parser = subparsers.add_parser('permission', help='Modify user permissions')
     permission_parser.add_argument('--username', required=True, help='GitLab username')
     permission_parser.add_argument('--target', required=True, help='Group or project path')
-    permission_parser.add_argument('--role', required=True, choices=list(ROLE_MAPPING.keys()),
+    permission_parser.add_argument('--role', required=True, choices=ROLE_CHOICES,
                                    help='Permission role to assign')
 
     # Subparser for get_items_by_year
     items_parser = subparsers.add_parser('items', help='Get issues or merge requests by year')
-    items_parser.add_argument('--type', required=True, choices=['mr', 'issues'],
+    items_parser.add_argument('--type', required=True, choices=ITEMS + [ALL_ITEMS],
                               help='Type of items to retrieve')
     items_parser.add_argument('--year', required=True, type=int,
                               help='Year to filter by (4-digit year)')
@@ -0,0 +1,18 @@
+import multiprocessing
+import os
+
+# Gunicorn configuration for running the GitLab API Service in production
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Requests mostly wait on GitLab, so use threaded workers to serve many at once
+worker_class = "gthread"
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", "32"))
+
+# Keep client connections open between requests (longer than typical LB idle timeouts)
+keepalive = 75
+# Paginating a busy year can take a while
+timeout = 120
+
+accesslog = "-"
+errorlog = "-"
@@ -0,0 +1,94 @@
+import unittest
+from unittest import mock
+
+import orjson
+
+import app
+import gitlab_util
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.content = orjson.dumps(body)
+        self.text = self.content.decode()
+
+    def json(self):
+        return orjson.loads(self.content)
+
+
+class FakeMemberSession:
+    """Knows every user and accepts every new membership"""
+
+    def __init__(self):
+        self.posts = []
+
+    def get(self, url, timeout=None):
+        return FakeResponse(200, [{"id": 7}])
+
+    def post(self, url, json=None, timeout=None):
+        self.posts.append((url, json))
+        return FakeResponse(201, {})
+
+
+class PermissionsTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+        self.session = FakeMemberSession()
+        for name, value in (("SESSION", self.session), ("TOKEN", "token")):
+            patcher = mock.patch.object(gitlab_util, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        gitlab_util.clear_caches()
+
+    def test_non_string_username_is_a_validation_error(self):
+        response = self.client.post("/permission", json={"username": 123, "target": "my-group", "role": "developer"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Username must be a string", response.get_json()["errors"])
+        self.assertEqual(self.session.posts, [])
+
+    def test_mixed_batch_reports_each_change(self):
+        response = self.client.post("/permissions", json={"changes": [
+            {"username": "alice", "target": "my-group", "role": "developer"},
+            {"username": 123, "target": "my-group", "role": "developer"},
+            {"username": "bob", "target": "my-group", "role": 7},
+            {"username": "carol"},
+            "not-an-object",
+        ]})
+
+        self.assertEqual(response.status_code, 400)
+        body = response.get_json()
+        self.assertEqual(body["status"], "partial")
+        self.assertEqual([r["status"] for r in body["results"]],
+                         ["success", "error", "error", "error", "error"])
+        self.assertIn("Username must be a string", body["results"][1]["errors"])
+        self.assertIn("Invalid role: 7", body["results"][2]["errors"][0])
+        self.assertEqual(len(self.session.posts), 1)
+
+
+class ItemsEndpointTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+        app.cache.clear()
+        self.addCleanup(app.cache.clear)
+        patcher = mock.patch.object(gitlab_util, "TOKEN", "token")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch("app.gitlab_util.collect_items_by_year")
+    def test_etag_revalidation_and_cache(self, collect_items_by_year):
+        collect_items_by_year.return_value = {"status": "success", "message": "ok", "data": [{"id": 1}]}
+
+        first = self.client.get("/items?type=mr&year=2019")
+        again = self.client.get("/items?type=mr&year=02019", headers={"If-None-Match": first.headers["ETag"]})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.get_json()["data"], [{"id": 1}])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.data, b"")
+        collect_items_by_year.assert_called_once_with("mr", 2019)
+
+
+if __name__ == "__main__":
+    unittest.main()
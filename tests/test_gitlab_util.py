@@ -0,0 +1,220 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import orjson
+
+import gitlab_util
+
+
+class FakeResponse:
+    def __init__(self, status_code, body, headers=None, links=None):
+        self.status_code = status_code
+        self.content = orjson.dumps(body)
+        self.text = self.content.decode()
+        self.headers = headers or {}
+        self.links = links or {}
+
+    def json(self):
+        return orjson.loads(self.content)
+
+
+def make_item(item_id):
+    return {"id": item_id, "title": f"Item {item_id}", "created_at": "2020-01-01T00:00:00Z",
+            "state": "opened", "web_url": f"https://gitlab.example/{item_id}", "description": "unused"}
+
+
+class FakeItemsSession:
+    """Serves numbered pages of items, optionally slow or failing on some pages"""
+
+    def __init__(self, total_pages, delay=0.0, fail=None):
+        self.total_pages = total_pages
+        self.delay = delay
+        self.fail = fail or set()
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None):
+        item_type = "mr" if "merge_requests" in url else "issues"
+        page = params["page"]
+        with self.lock:
+            self.requests.append((item_type, page))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        if page > 1:
+            time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        if (item_type, page) in self.fail:
+            return FakeResponse(500, {"message": "boom"})
+        items = [make_item(page * 1000 + i) for i in range(gitlab_util.PER_PAGE)]
+        return FakeResponse(200, items, {"X-Total-Pages": str(self.total_pages)})
+
+
+class FakeLinkSession:
+    """Serves pages without X-Total-Pages, chained through 'next' links"""
+
+    def __init__(self, total_pages):
+        self.total_pages = total_pages
+        self.requests = []
+
+    def get(self, url, params=None, timeout=None):
+        self.requests.append((url, params))
+        page = params["page"] if params else int(url.rsplit("=", 1)[1])
+        links = {"next": {"url": f"https://gitlab.example/next?page={page + 1}"}} if page < self.total_pages else {}
+        return FakeResponse(200, [make_item(page)], links=links)
+
+
+class FakeMemberSession:
+    """Replies to member POST/PUT calls from queues of status codes"""
+
+    def __init__(self, posts=(), puts=()):
+        self.post_statuses = list(posts)
+        self.put_statuses = list(puts)
+        self.calls = []
+
+    def get(self, url, timeout=None):
+        return FakeResponse(200, [{"id": 7}])
+
+    def post(self, url, json=None, timeout=None):
+        self.calls.append("POST")
+        return FakeResponse(self.post_statuses.pop(0), {})
+
+    def put(self, url, json=None, timeout=None):
+        self.calls.append("PUT")
+        return FakeResponse(self.put_statuses.pop(0), {})
+
+
+class ItemsTest(unittest.TestCase):
+    def patch_session(self, session):
+        patcher = mock.patch.object(gitlab_util, "SESSION", session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def setUp(self):
+        patcher = mock.patch.object(gitlab_util, "TOKEN", "token")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_all_stops_early(self, failing_type):
+        session = FakeItemsSession(total_pages=30, delay=0.05, fail={(failing_type, 2)})
+        self.patch_session(session)
+
+        result = gitlab_util.get_items_by_year("all", 2020)
+
+        self.assertEqual(result["status"], "error")
+        self.assertIn("500", result["message"])
+        # Each paginator gets at most its first page and one window of pages in
+        other_type = "issues" if failing_type == "mr" else "mr"
+        other_requests = [page for item_type, page in session.requests if item_type == other_type]
+        self.assertLess(len(other_requests), session.total_pages)
+        # Let requests already in flight finish against the fake session
+        time.sleep(session.delay * 3)
+
+    def test_all_stops_when_mr_fails(self):
+        self.assert_all_stops_early("mr")
+
+    def test_all_stops_when_issues_fails(self):
+        self.assert_all_stops_early("issues")
+
+    def test_pages_are_fetched_in_a_bounded_window_and_kept_in_order(self):
+        session = FakeItemsSession(total_pages=20, delay=0.02)
+        self.patch_session(session)
+
+        result = gitlab_util.get_items_by_year("mr", 2020)
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(len(result["data"]), 20 * gitlab_util.PER_PAGE)
+        self.assertEqual([item["id"] for item in result["data"]][::gitlab_util.PER_PAGE],
+                         [page * 1000 for page in range(1, 21)])
+        self.assertEqual(set(result["data"][0]), set(gitlab_util.ITEM_FIELDS))
+        self.assertLessEqual(session.max_in_flight, gitlab_util.PAGE_FETCH_WORKERS)
+
+    def test_error_cancels_remaining_pages(self):
+        session = FakeItemsSession(total_pages=40, delay=0.05, fail={("mr", 2)})
+        self.patch_session(session)
+
+        result = gitlab_util.get_items_by_year("mr", 2020)
+
+        self.assertEqual(result["status"], "error")
+        time.sleep(session.delay * 3)
+        # The first page plus at most a window and a refill, not all 40 pages
+        self.assertLessEqual(len(session.requests), 1 + 2 * gitlab_util.PAGE_FETCH_WORKERS)
+
+    def test_closing_the_stream_stops_fetching(self):
+        session = FakeItemsSession(total_pages=40, delay=0.05)
+        self.patch_session(session)
+
+        items = gitlab_util.iter_items_by_year("issues", 2020)
+        for _ in range(gitlab_util.PER_PAGE + 1):
+            next(items)
+        items.close()
+        time.sleep(session.delay * 3)
+
+        self.assertLessEqual(len(session.requests), 1 + 2 * gitlab_util.PAGE_FETCH_WORKERS)
+
+    def test_follows_next_links_without_page_count(self):
+        session = FakeLinkSession(total_pages=3)
+        self.patch_session(session)
+
+        result = gitlab_util.get_items_by_year("issues", 2020)
+
+        self.assertEqual([item["id"] for item in result["data"]], [1, 2, 3])
+        self.assertEqual([url for url, _ in session.requests[1:]],
+                         ["https://gitlab.example/next?page=2", "https://gitlab.example/next?page=3"])
+
+
+class ModifyPermissionTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(gitlab_util, "TOKEN", "token")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        gitlab_util.clear_caches()
+        self.addCleanup(gitlab_util.clear_caches)
+
+    def modify(self, session, role="developer"):
+        with mock.patch.object(gitlab_util, "SESSION", session):
+            return gitlab_util.modify_permission("alice", "my-group", role)
+
+    def test_new_member_is_added_with_post(self):
+        session = FakeMemberSession(posts=[201])
+
+        result = self.modify(session)
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["data"], {"user_id": 7, "access_level": 30})
+        self.assertEqual(session.calls, ["POST"])
+
+    def test_existing_member_conflict_falls_back_to_put(self):
+        session = FakeMemberSession(posts=[409], puts=[200])
+
+        self.assertEqual(self.modify(session)["status"], "success")
+        self.assertEqual(session.calls, ["POST", "PUT"])
+
+    def test_known_member_goes_straight_to_put(self):
+        self.modify(FakeMemberSession(posts=[201]))
+        session = FakeMemberSession(puts=[200])
+
+        self.assertEqual(self.modify(session, role="maintainer")["status"], "success")
+        self.assertEqual(session.calls, ["PUT"])
+
+    def test_known_member_with_same_role_still_calls_gitlab(self):
+        self.modify(FakeMemberSession(posts=[201]))
+        session = FakeMemberSession(puts=[200])
+
+        self.assertEqual(self.modify(session)["status"], "success")
+        self.assertEqual(session.calls, ["PUT"])
+
+    def test_removed_member_is_added_again_after_put_404(self):
+        self.modify(FakeMemberSession(posts=[201]))
+        session = FakeMemberSession(posts=[201], puts=[404])
+
+        self.assertEqual(self.modify(session)["status"], "success")
+        self.assertEqual(session.calls, ["PUT", "POST"])
+
+
+if __name__ == "__main__":
+    unittest.main()